@@ -8,7 +8,10 @@ from flask_cors import CORS
 
 from .config import Config
 from .extensions import db
+from .instrumentation import init_instrumentation
 from .routes import auth_bp, chat_bp, progress_bp
+from .services.history_cache import HistoryCache
+from .services.latency_governor import LatencyGovernor
 
 logging.basicConfig(
     level=os.getenv("LOG_LEVEL", "INFO"),
@@ -31,6 +34,19 @@ def create_app(config_class: type[Config] = Config) -> Flask:
     app.config.from_object(config_class)
 
     db.init_app(app)
+    init_instrumentation(app)
+    app.extensions["latency_governor"] = LatencyGovernor(
+        budget_ms=app.config["CHAT_LATENCY_BUDGET_MS"],
+        queue_soft_limit=app.config["CHAT_QUEUE_SOFT_LIMIT"],
+        queue_hard_limit=app.config["CHAT_QUEUE_HARD_LIMIT"],
+        fallback_model=app.config.get("OLLAMA_FALLBACK_MODEL"),
+        stale_after=app.config["CHAT_STATS_TTL_SECONDS"],
+    )
+    app.extensions["history_cache"] = HistoryCache(
+        capacity=app.config["HISTORY_CACHE_SIZE"],
+        max_users=app.config["HISTORY_CACHE_MAX_USERS"],
+        max_bytes=app.config["HISTORY_CACHE_MAX_BYTES"],
+    )
 
     origins = [
         origin.strip()
@@ -42,7 +58,8 @@ def create_app(config_class: type[Config] = Config) -> Flask:
         app,
         resources={r"/*": {"origins": origins or ["http://localhost:3000"]}},
         supports_credentials=True,
-        allow_headers=["Content-Type"],
+        # X-Admin-Token / X-Profile let admins capture profiles from the browser too.
+        allow_headers=["Content-Type", "X-Admin-Token", "X-Profile"],
         methods=["GET", "POST", "OPTIONS"],
     )
 
@@ -63,7 +80,7 @@ def create_app(config_class: type[Config] = Config) -> Flask:
             )
             response.headers.setdefault(
                 "Access-Control-Allow-Headers",
-                "Content-Type",
+                "Content-Type,X-Admin-Token,X-Profile",
             )
         return response
 
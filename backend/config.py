@@ -20,6 +20,25 @@ class Config:
     SESSION_COOKIE_SECURE = False
     # Allow React dev server defaults (http://localhost:3000)
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000")
+    # Opt-in request instrumentation (Server-Timing header, SQL accounting, slow logs).
+    INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "0").lower() in {"1", "true", "yes"}
+    SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "2000"))
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+    # Unset disables admin-only endpoints and on-demand profiling entirely.
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+    PROFILE_HISTORY_SIZE = 20
+    # Adaptive chat degradation: keep /chat latency within budget under load.
+    CHAT_LATENCY_BUDGET_MS = float(os.getenv("CHAT_LATENCY_BUDGET_MS", "20000"))
+    CHAT_QUEUE_SOFT_LIMIT = int(os.getenv("CHAT_QUEUE_SOFT_LIMIT", "2"))
+    CHAT_QUEUE_HARD_LIMIT = int(os.getenv("CHAT_QUEUE_HARD_LIMIT", "6"))
+    OLLAMA_FALLBACK_MODEL = os.getenv("OLLAMA_FALLBACK_MODEL") or None
+    # Throughput measurements older than this are discarded and re-measured.
+    CHAT_STATS_TTL_SECONDS = float(os.getenv("CHAT_STATS_TTL_SECONDS", "120"))
+    # Per-user ring buffer of recent messages; a size of 0 disables the cache.
+    HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "50"))
+    HISTORY_CACHE_MAX_USERS = int(os.getenv("HISTORY_CACHE_MAX_USERS", "1000"))
+    HISTORY_CACHE_MAX_BYTES = int(os.getenv("HISTORY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
 
 
 class TestConfig(Config):
@@ -0,0 +1,241 @@
+"""Opt-in request instrumentation: phase timings, SQL accounting, and profiling.
+
+Enable with ``INSTRUMENTATION_ENABLED=1``. Every request then carries a
+``Server-Timing`` header (one entry per phase plus ``db`` and ``total``), and
+requests slower than ``SLOW_REQUEST_MS`` are logged together with their most
+repeated SQL statements so N+1 patterns stand out.
+
+Setting ``ADMIN_TOKEN`` additionally lets an operator send ``X-Profile: 1``
+together with ``X-Admin-Token: <token>`` on a single request to capture a
+sampling profile of it. Captured profiles are logged and kept in memory for
+``GET /debug/profiles``.
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from flask import Flask, current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .utils import admin_required, is_admin_request
+
+logger = logging.getLogger("backend.instrumentation")
+
+PROFILE_HEADER = "X-Profile"
+
+
+@dataclass
+class RequestMetrics:
+    """Timings collected over the lifetime of a single request."""
+
+    started: float = field(default_factory=time.perf_counter)
+    phases: Dict[str, float] = field(default_factory=dict)
+    query_count: int = 0
+    query_ms: float = 0.0
+    statements: Dict[str, List[float]] = field(default_factory=dict)
+    profiler: Optional["SamplingProfiler"] = None
+
+    def add_phase(self, name: str, elapsed_ms: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed_ms
+
+    def add_query(self, statement: str, elapsed_ms: float) -> None:
+        self.query_count += 1
+        self.query_ms += elapsed_ms
+        stats = self.statements.setdefault(statement, [0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed_ms
+
+    def server_timing(self, total_ms: float) -> str:
+        entries = [f"{name};dur={elapsed:.1f}" for name, elapsed in self.phases.items()]
+        entries.append(f'db;dur={self.query_ms:.1f};desc="{self.query_count} queries"')
+        entries.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(entries)
+
+
+class SamplingProfiler:
+    """Periodically sample one thread's stack and count collapsed call paths."""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                # Root-first, semicolon separated: the "collapsed" flame graph format.
+                self.samples[";".join(reversed(stack))] += 1
+
+    def summary(self, top: int = 25) -> dict:
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": sum(self.samples.values()),
+            "stacks": [
+                {"stack": stack, "count": count}
+                for stack, count in self.samples.most_common(top)
+            ],
+        }
+
+
+def _current_metrics() -> Optional[RequestMetrics]:
+    if not has_request_context():
+        return None
+    return g.get("request_metrics")
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a block of request handling and report it in ``Server-Timing``."""
+    metrics = _current_metrics()
+    if metrics is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_phase(name, (time.perf_counter() - started) * 1000)
+
+
+# The start time lives on the per-statement execution context, so a statement
+# that raises (and never reaches after_cursor_execute) leaves nothing behind.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current_metrics() is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics = _current_metrics()
+    started = getattr(context, "_query_started", None)
+    if metrics is None or started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    metrics.add_query(statement, elapsed_ms)
+    if elapsed_ms >= current_app.config["SLOW_QUERY_MS"]:
+        logger.warning("Slow query (%.1f ms) on %s: %s", elapsed_ms, request.path, statement)
+
+
+def _log_slow_request(metrics: RequestMetrics, total_ms: float, status_code: int) -> None:
+    repeated = sorted(
+        (
+            (count, elapsed, statement)
+            for statement, (count, elapsed) in metrics.statements.items()
+            if count > 1
+        ),
+        reverse=True,
+    )[:3]
+    logger.warning(
+        "Slow request %s %s -> %s in %.1f ms (phases: %s; %s queries in %.1f ms)",
+        request.method,
+        request.path,
+        status_code,
+        total_ms,
+        ", ".join(f"{name}={elapsed:.1f}ms" for name, elapsed in metrics.phases.items()) or "none",
+        metrics.query_count,
+        metrics.query_ms,
+    )
+    for count, elapsed, statement in repeated:
+        logger.warning("  repeated %sx (%.1f ms total): %s", count, elapsed, statement)
+
+
+def init_instrumentation(app: Flask) -> None:
+    """Register request hooks and the profile viewer on ``app``."""
+    enabled = app.config.get("INSTRUMENTATION_ENABLED", False)
+    profiling = bool(app.config.get("ADMIN_TOKEN"))
+    if not enabled and not profiling:
+        return
+
+    profiles: deque = deque(maxlen=app.config.get("PROFILE_HISTORY_SIZE", 20))
+    app.extensions["instrumentation"] = {"profiles": profiles}
+
+    @app.before_request
+    def _start_request_metrics():
+        profile_requested = (
+            profiling and request.headers.get(PROFILE_HEADER) == "1" and is_admin_request()
+        )
+        if not enabled and not profile_requested:
+            return
+        metrics = RequestMetrics()
+        if profile_requested:
+            metrics.profiler = SamplingProfiler(
+                threading.get_ident(),
+                app.config.get("PROFILE_SAMPLE_INTERVAL_MS", 5) / 1000,
+            )
+            metrics.profiler.start()
+        g.request_metrics = metrics
+
+    @app.after_request
+    def _finish_request_metrics(response):
+        metrics = g.pop("request_metrics", None)
+        if metrics is None:
+            return response
+
+        total_ms = (time.perf_counter() - metrics.started) * 1000
+        response.headers["Server-Timing"] = metrics.server_timing(total_ms)
+
+        if metrics.profiler is not None:
+            metrics.profiler.stop()
+            report = {
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "total_ms": round(total_ms, 1),
+                "captured_at": datetime.utcnow().isoformat(),
+                **metrics.profiler.summary(),
+            }
+            profiles.append(report)
+            logger.info(
+                "Captured profile for %s %s (%s samples); top stack: %s",
+                request.method,
+                request.path,
+                report["samples"],
+                report["stacks"][0]["stack"] if report["stacks"] else "n/a",
+            )
+
+        if enabled and total_ms >= app.config["SLOW_REQUEST_MS"]:
+            _log_slow_request(metrics, total_ms, response.status_code)
+        return response
+
+    @app.teardown_request
+    def _stop_orphaned_profiler(exc):
+        # Backstop for when response finalization itself fails (e.g. another
+        # after_request hook raises) and ours never ran; never leave a sampler running.
+        metrics = g.pop("request_metrics", None)
+        if metrics is not None and metrics.profiler is not None:
+            metrics.profiler.stop()
+
+    if profiling:
+
+        @app.get("/debug/profiles")
+        @admin_required
+        def debug_profiles():
+            """Return the most recently captured request profiles, newest first."""
+            return jsonify({"profiles": list(reversed(profiles))})
@@ -1,13 +1,15 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Sequence
 
 from flask import current_app, jsonify, request
 
 from ..extensions import db
+from ..instrumentation import phase
 from ..models import Chat
+from ..services.history_cache import CachedChat
 from ..services.ollama_client import OllamaError, check_ollama_health, generate_response
-from ..utils import login_required
+from ..utils import admin_required, login_required
 from . import chat_bp
 
 SYSTEM_CONTEXT = (
@@ -18,7 +20,7 @@ SYSTEM_CONTEXT = (
 )
 
 
-def build_prompt(history: List[Chat], latest_message: str, user_name: str) -> str:
+def build_prompt(history: Sequence[Chat | CachedChat], latest_message: str, user_name: str) -> str:
     """Create a contextual prompt for the Ollama model."""
     transcript_lines = []
     for chat in history:
@@ -36,6 +38,17 @@ def build_prompt(history: List[Chat], latest_message: str, user_name: str) -> st
     )
 
 
+def _load_history(user_id: int, limit: int) -> List[Chat]:
+    """Read a user's last ``limit`` messages from the database, oldest first."""
+    chat_entries = (
+        Chat.query.filter_by(user_id=user_id)
+        .order_by(Chat.timestamp.desc())
+        .limit(limit)
+        .all()
+    )
+    return list(reversed(chat_entries))
+
+
 @chat_bp.post("/chat")
 @login_required
 def chat(user):
@@ -45,59 +58,100 @@ def chat(user):
     if not message:
         return jsonify({"error": "Message is required"}), 400
 
-    # Persist the user's message first.
-    user_entry = Chat(user_id=user.id, message=message, sender="user")
-    db.session.add(user_entry)
-    db.session.flush()  # ensures new entry has an ID if needed later
-
-    # Include the fresh message plus recent history for context.
-    recent_history = (
-        Chat.query.filter_by(user_id=user.id)
-        .order_by(Chat.timestamp.desc())
-        .limit(10)
-        .all()
+    governor = current_app.extensions["latency_governor"]
+    history_cache = current_app.extensions["history_cache"]
+    requested_model = (payload.get("model") or "").strip() or "llama2"
+
+    with governor.track() as depth:
+        tier = governor.choose(depth, requested_model)
+        model_name = governor.model_for(tier, requested_model)
+
+        # Read earlier turns before adding the new message so a rolled-back
+        # request never leaves an unpersisted row in the history cache.
+        with phase("history"):
+            earlier_history = history_cache.recent(
+                user.id,
+                tier.history_depth - 1,
+                loader=lambda limit: _load_history(user.id, limit),
+            )
+
+        # Persist the user's message first.
+        user_entry = Chat(user_id=user.id, message=message, sender="user")
+        db.session.add(user_entry)
+        db.session.flush()  # ensures new entry has an ID and timestamp for the snapshot below
+        user_snapshot = CachedChat.from_model(user_entry)
+
+        # Include the fresh message plus recent history for context.
+        ordered_history = [*earlier_history, user_snapshot]
+
+        with phase("prompt"):
+            prompt = build_prompt(ordered_history, latest_message=message, user_name=user.username)
+
+        generation_metrics: dict = {}
+        try:
+            with phase("ollama"):
+                response_text = generate_response(
+                    prompt,
+                    model=model_name,
+                    options=tier.options() or None,
+                    metrics=generation_metrics,
+                )
+        except OllamaError as exc:
+            db.session.rollback()
+            current_app.logger.exception("Ollama generation failed for user %s: %s", user.id, exc)
+            suggestion = (
+                f"Open a terminal and run `ollama run {model_name}` to restart the local model, "
+                "then refresh this page."
+            )
+            return (
+                jsonify(
+                    {
+                        "error": "Mama Akinyi is offline.",
+                        "details": {
+                            "reason": getattr(exc, "reason", str(exc)),
+                            "suggestion": suggestion,
+                            "model": model_name,
+                        },
+                    }
+                ),
+                503,
+            )
+
+    governor.record(
+        model_name,
+        generation_metrics,
+        tier=tier,
+        prompt_chars=len(prompt),
+        history_chars=sum(len(entry.message) for entry in ordered_history),
+        history_messages=len(ordered_history),
     )
-    ordered_history = list(reversed(recent_history))
-
-    prompt = build_prompt(ordered_history, latest_message=message, user_name=user.username)
-    model_name = (payload.get("model") or "").strip() or "llama2"
-
-    try:
-        response_text = generate_response(prompt, model=model_name)
-    except OllamaError as exc:
-        db.session.rollback()
-        current_app.logger.exception("Ollama generation failed for user %s: %s", user.id, exc)
-        suggestion = (
-            f"Open a terminal and run `ollama run {model_name}` to restart the local model, "
-            "then refresh this page."
-        )
-        return (
-            jsonify(
-                {
-                    "error": "Mama Akinyi is offline.",
-                    "details": {
-                        "reason": getattr(exc, "reason", str(exc)),
-                        "suggestion": suggestion,
-                        "model": model_name,
-                    },
-                }
-            ),
-            503,
-        )
 
     assistant_entry = Chat(user_id=user.id, message=response_text, sender="assistant")
     db.session.add(assistant_entry)
-    db.session.commit()
-
-    return jsonify(
-        {
-            "reply": response_text,
-            "chat": {
-                "user_message": user_entry.to_dict(),
-                "assistant_message": assistant_entry.to_dict(),
-            },
-        }
-    )
+    with phase("commit"):
+        db.session.flush()
+        # Snapshot before commit expires the rows, so serializing needs no reload.
+        assistant_snapshot = CachedChat.from_model(assistant_entry)
+        db.session.commit()
+    # ``user`` was expired by the commit; the snapshot avoids reloading it.
+    history_cache.append(user_snapshot.user_id, [user_snapshot, assistant_snapshot])
+
+    with phase("serialize"):
+        return jsonify(
+            {
+                "reply": response_text,
+                "chat": {
+                    "user_message": user_snapshot.to_dict(),
+                    "assistant_message": assistant_snapshot.to_dict(),
+                },
+                "meta": {
+                    "tier": tier.name,
+                    "model": model_name,
+                    "history_depth": tier.history_depth,
+                    "num_predict": tier.num_predict,
+                },
+            }
+        )
 
 
 @chat_bp.get("/ollama/health")
@@ -133,11 +187,18 @@ def history(user):
         limit = 50
     limit = max(1, min(limit, 200))
 
-    chat_entries = (
-        Chat.query.filter_by(user_id=user.id)
-        .order_by(Chat.timestamp.desc())
-        .limit(limit)
-        .all()
-    )
-    ordered = list(reversed(chat_entries))
-    return jsonify({"history": [item.to_dict() for item in ordered]})
+    with phase("history"):
+        ordered = current_app.extensions["history_cache"].recent(
+            user.id,
+            limit,
+            loader=lambda n: _load_history(user.id, n),
+        )
+    with phase("serialize"):
+        return jsonify({"history": [item.to_dict() for item in ordered]})
+
+
+@chat_bp.get("/debug/history-cache")
+@admin_required
+def history_cache_stats():
+    """Report occupancy and hit rate of the in-memory chat history cache."""
+    return jsonify({"history_cache": current_app.extensions["history_cache"].stats()})
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import sys
+import threading
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Deque, Dict, Iterable, List
+
+# Rough per-entry cost of the dataclass, its fields, and the deque slot.
+ENTRY_OVERHEAD_BYTES = 400
+
+
+@dataclass(frozen=True)
+class CachedChat:
+    """Detached snapshot of a ``Chat`` row, safe to share across requests."""
+
+    id: int
+    user_id: int
+    message: str
+    sender: str
+    timestamp: datetime
+
+    @classmethod
+    def from_model(cls, chat) -> "CachedChat":
+        return cls(
+            id=chat.id,
+            user_id=chat.user_id,
+            message=chat.message,
+            sender=chat.sender,
+            timestamp=chat.timestamp,
+        )
+
+    @property
+    def sort_key(self) -> tuple:
+        # Matches the database page order: by timestamp, ties broken by insertion id.
+        return (self.timestamp, self.id)
+
+    @property
+    def size(self) -> int:
+        return sys.getsizeof(self.message) + ENTRY_OVERHEAD_BYTES
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "message": self.message,
+            "sender": self.sender,
+            "timestamp": self.timestamp.isoformat(),
+        }
+
+
+@dataclass
+class _UserHistory:
+    entries: Deque[CachedChat]
+    # True while the buffer holds the user's entire history, not just its tail.
+    complete: bool
+    size: int = field(default=0)
+
+
+class HistoryCache:
+    """Write-through ring buffer of each active user's most recent messages.
+
+    Buffers are filled lazily from the database on a miss and extended after
+    the chat route commits, so they only ever contain persisted rows. Entries
+    are kept in ``(timestamp, id)`` order, so interleaved turns from concurrent
+    requests read back in the same order as the database. Idle users are
+    evicted least-recently-used first once either ``max_users`` or
+    ``max_bytes`` is exceeded. The cache is per process: run a single worker
+    (or disable it with ``capacity=0``) when several processes share a database.
+    """
+
+    def __init__(self, *, capacity: int, max_users: int, max_bytes: int) -> None:
+        self.capacity = capacity
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._users: "OrderedDict[int, _UserHistory]" = OrderedDict()
+        # Users with loads in flight -> [loads in flight, writes seen while loading].
+        self._loading: Dict[int, List[int]] = {}
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._bypasses = 0
+        self._evictions = 0
+
+    def recent(
+        self,
+        user_id: int,
+        limit: int,
+        loader: Callable[[int], List],
+    ) -> List[CachedChat]:
+        """Return the user's last ``limit`` messages, oldest first.
+
+        ``loader(n)`` must return the user's last ``n`` persisted ``Chat`` rows,
+        oldest first. It is used to fill the buffer on a miss, and directly
+        when ``limit`` is more than the buffer can answer.
+        """
+        if limit <= 0:
+            return []
+
+        with self._lock:
+            history = self._users.get(user_id)
+            if history is not None and (limit <= len(history.entries) or history.complete):
+                self._users.move_to_end(user_id)
+                self._hits += 1
+                return list(history.entries)[-limit:]
+            if self.capacity <= 0 or limit > self.capacity:
+                self._bypasses += 1
+                bypass = True
+            else:
+                self._misses += 1
+                loading = self._loading.setdefault(user_id, [0, 0])
+                loading[0] += 1
+                writes_before = loading[1]
+                bypass = False
+
+        if bypass:
+            return [CachedChat.from_model(chat) for chat in loader(limit)]
+
+        try:
+            rows = [CachedChat.from_model(chat) for chat in loader(self.capacity)]
+        except BaseException:
+            with self._lock:
+                self._finish_load(user_id)
+            raise
+
+        with self._lock:
+            # A write committed mid-load may be missing from ``rows``; serve them
+            # but leave the next read to load again rather than cache a stale tail.
+            raced = self._finish_load(user_id) != writes_before
+            if not raced and user_id not in self._users:
+                history = _UserHistory(
+                    entries=deque(rows, maxlen=self.capacity),
+                    complete=len(rows) < self.capacity,
+                    size=sum(entry.size for entry in rows),
+                )
+                self._users[user_id] = history
+                self._size += history.size
+                self._evict()
+        return rows[-limit:]
+
+    def append(self, user_id: int, entries: Iterable[CachedChat]) -> None:
+        """Record freshly committed messages for a user already in the cache."""
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id][1] += 1
+            history = self._users.get(user_id)
+            if history is None:
+                # Not cached yet: the next read loads these rows from the database.
+                return
+            for entry in entries:
+                self._insert(history, entry)
+            self._users.move_to_end(user_id)
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "users": len(self._users),
+                "bytes": self._size,
+                "max_users": self.max_users,
+                "max_bytes": self.max_bytes,
+                "capacity_per_user": self.capacity,
+                "hits": self._hits,
+                "misses": self._misses,
+                "bypasses": self._bypasses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+            }
+
+    def _insert(self, history: _UserHistory, entry: CachedChat) -> None:
+        if any(cached.id == entry.id for cached in history.entries):
+            # A load that ran after this row's commit already picked it up.
+            return
+        keys = [cached.sort_key for cached in history.entries]
+        position = bisect_right(keys, entry.sort_key)
+        if len(history.entries) == history.entries.maxlen:
+            if position == 0:
+                # Older than everything in a full buffer: outside the cached tail.
+                return
+            dropped = history.entries.popleft()
+            history.size -= dropped.size
+            self._size -= dropped.size
+            history.complete = False
+            position -= 1
+        history.entries.insert(position, entry)
+        history.size += entry.size
+        self._size += entry.size
+
+    def _finish_load(self, user_id: int) -> int:
+        """Mark one load for ``user_id`` done; return the writes seen so far."""
+        loading = self._loading[user_id]
+        loading[0] -= 1
+        if loading[0] == 0:
+            del self._loading[user_id]
+        return loading[1]
+
+    def _evict(self) -> None:
+        while self._users and (len(self._users) > self.max_users or self._size > self.max_bytes):
+            _, history = self._users.popitem(last=False)
+            self._size -= history.size
+            self._evictions += 1
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_MODELS = 8
+
+
+@dataclass(frozen=True)
+class DegradationTier:
+    """How much work a single chat turn is allowed to ask of the model."""
+
+    name: str
+    history_depth: int
+    num_predict: Optional[int] = None
+    num_ctx: Optional[int] = None
+    use_fallback_model: bool = False
+
+    def options(self) -> Dict[str, Any]:
+        options: Dict[str, Any] = {}
+        if self.num_predict is not None:
+            options["num_predict"] = self.num_predict
+        if self.num_ctx is not None:
+            options["num_ctx"] = self.num_ctx
+        return options
+
+
+# Ordered from full quality to cheapest; the governor picks the first that fits the budget.
+TIERS: Tuple[DegradationTier, ...] = (
+    DegradationTier("full", history_depth=10),
+    DegradationTier("reduced", history_depth=6, num_predict=256),
+    DegradationTier("minimal", history_depth=2, num_predict=128, num_ctx=2048, use_fallback_model=True),
+)
+
+
+@dataclass
+class _ModelStats:
+    """Smoothed throughput and size averages for one Ollama model."""
+
+    updated_at: float
+    tokens_per_sec: Optional[float] = None
+    reply_tokens: Optional[float] = None
+    prompt_tokens_per_sec: Optional[float] = None
+    prompt_tokens_per_char: Optional[float] = None
+    fixed_prompt_chars: Optional[float] = None
+    chars_per_message: Optional[float] = None
+
+    @property
+    def complete(self) -> bool:
+        return None not in (
+            self.tokens_per_sec,
+            self.reply_tokens,
+            self.prompt_tokens_per_sec,
+            self.prompt_tokens_per_char,
+            self.fixed_prompt_chars,
+            self.chars_per_message,
+        )
+
+
+class LatencyGovernor:
+    """Choose a degradation tier from queue depth and recent Ollama throughput.
+
+    Ollama serves generations one after another by default, so a request that
+    arrives behind ``depth - 1`` others waits roughly that many generations.
+    A tier's projected latency is ``depth`` times the cost of one generation:
+    reading the prompt plus writing the reply (average reply length capped by
+    ``num_predict``), each at its measured tokens/sec. Prompt size is modelled
+    as the fixed text (persona, framing, latest message) plus the average
+    history message times the tier's ``history_depth``, converted to tokens
+    with the measured tokens-per-character ratio and capped by ``num_ctx``, so
+    every cheaper tier is strictly cheaper.
+
+    Averages are exponentially smoothed and kept per model, so a fast fallback
+    model never makes the primary look cheap. A model's averages are dropped
+    once no generation has refreshed them for ``stale_after`` seconds; while the
+    fallback model is serving, that returns the governor to the queue-depth
+    rule, which sends a full-quality request to re-measure the primary when
+    the queue is short.
+    """
+
+    def __init__(
+        self,
+        *,
+        budget_ms: float,
+        queue_soft_limit: int,
+        queue_hard_limit: int,
+        fallback_model: Optional[str] = None,
+        smoothing: float = 0.3,
+        stale_after: float = 120.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.budget_ms = budget_ms
+        self.queue_soft_limit = queue_soft_limit
+        self.queue_hard_limit = queue_hard_limit
+        self.fallback_model = fallback_model
+        self.smoothing = smoothing
+        self.stale_after = stale_after
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # Model names come from clients, so only the most recently used few are kept.
+        self._stats: "OrderedDict[str, _ModelStats]" = OrderedDict()
+
+    @contextmanager
+    def track(self) -> Iterator[int]:
+        """Count a chat request as queued for its duration; yields the current depth."""
+        with self._lock:
+            self._in_flight += 1
+            depth = self._in_flight
+        try:
+            yield depth
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def record(
+        self,
+        model: str,
+        metrics: Dict[str, Any],
+        *,
+        tier: DegradationTier,
+        prompt_chars: int,
+        history_chars: int,
+        history_messages: int,
+    ) -> None:
+        """Fold the Ollama timings of a generation by ``model`` at ``tier`` into its averages.
+
+        ``history_chars`` and ``history_messages`` describe the transcript part
+        of the ``prompt_chars``-long prompt; the rest is fixed text. Replies cut
+        short by ``num_predict`` still count towards tokens/sec but not towards
+        the average reply length, which would otherwise shrink while degraded
+        and make the full tier look cheaper than it is.
+        """
+        eval_count = metrics.get("eval_count")
+        eval_duration = metrics.get("eval_duration")  # nanoseconds
+        prompt_count = metrics.get("prompt_eval_count")
+        prompt_duration = metrics.get("prompt_eval_duration")  # nanoseconds
+        capped = tier.num_predict is not None and (eval_count or 0) >= tier.num_predict
+
+        with self._lock:
+            stats = self._fresh_stats(model)
+            if stats is None:
+                stats = self._stats[model] = _ModelStats(updated_at=self._clock())
+                while len(self._stats) > MAX_TRACKED_MODELS:
+                    self._stats.popitem(last=False)
+            self._stats.move_to_end(model)
+            stats.updated_at = self._clock()
+
+            if eval_count and eval_duration:
+                stats.tokens_per_sec = self._smooth(
+                    stats.tokens_per_sec, eval_count / (eval_duration / 1e9)
+                )
+                if not capped:
+                    stats.reply_tokens = self._smooth(stats.reply_tokens, float(eval_count))
+            if prompt_count and prompt_duration and prompt_chars > 0:
+                stats.prompt_tokens_per_sec = self._smooth(
+                    stats.prompt_tokens_per_sec, prompt_count / (prompt_duration / 1e9)
+                )
+                stats.prompt_tokens_per_char = self._smooth(
+                    stats.prompt_tokens_per_char, prompt_count / prompt_chars
+                )
+            stats.fixed_prompt_chars = self._smooth(
+                stats.fixed_prompt_chars, float(max(prompt_chars - history_chars, 0))
+            )
+            if history_messages > 0:
+                stats.chars_per_message = self._smooth(
+                    stats.chars_per_message, history_chars / history_messages
+                )
+
+    def projected_ms(self, tier: DegradationTier, depth: int, requested_model: str) -> Optional[float]:
+        """Estimate the latency of serving ``tier`` at ``depth``; ``None`` without fresh measurements."""
+        with self._lock:
+            stats = self._fresh_stats(requested_model)
+            model = self.model_for(tier, requested_model)
+            if model != requested_model:
+                # Until the fallback is measured, the primary is a conservative stand-in.
+                stats = self._fresh_stats(model) or stats
+            if stats is None or not stats.complete:
+                return None
+            stats = replace(stats)
+
+        prompt_chars = stats.fixed_prompt_chars + stats.chars_per_message * tier.history_depth
+        prompt_tokens = prompt_chars * stats.prompt_tokens_per_char
+        if tier.num_ctx is not None:
+            prompt_tokens = min(prompt_tokens, tier.num_ctx)
+        reply = min(stats.reply_tokens, tier.num_predict or stats.reply_tokens)
+        seconds = prompt_tokens / stats.prompt_tokens_per_sec + reply / stats.tokens_per_sec
+        return depth * seconds * 1000
+
+    def choose(self, depth: int, requested_model: str) -> DegradationTier:
+        """Return the richest tier whose projected latency fits the budget."""
+        if depth > self.queue_hard_limit:
+            tier = TIERS[-1]
+        elif self.projected_ms(TIERS[0], depth, requested_model) is None:
+            # Nothing fresh measured for this model: fall back on queue depth alone.
+            tier = TIERS[1] if depth > self.queue_soft_limit else TIERS[0]
+        else:
+            tier = TIERS[-1]
+            for candidate in TIERS:
+                if self.projected_ms(candidate, depth, requested_model) <= self.budget_ms:
+                    tier = candidate
+                    break
+
+        if tier is not TIERS[0]:
+            logger.info("Degrading chat to tier %s (depth=%s)", tier.name, depth)
+        return tier
+
+    def model_for(self, tier: DegradationTier, requested_model: str) -> str:
+        if tier.use_fallback_model and self.fallback_model:
+            return self.fallback_model
+        return requested_model
+
+    def _fresh_stats(self, model: str) -> Optional[_ModelStats]:
+        stats = self._stats.get(model)
+        if stats is not None and self._clock() - stats.updated_at > self.stale_after:
+            del self._stats[model]
+            return None
+        return stats
+
+    def _smooth(self, current: Optional[float], sample: float) -> float:
+        if current is None:
+            return sample
+        return current + self.smoothing * (sample - current)
@@ -36,8 +36,13 @@ def generate_response(
     options: Optional[Dict[str, Any]] = None,
     timeout: int = 60,
     max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    metrics: Optional[Dict[str, Any]] = None,
 ) -> str:
-    """Send a prompt to the local Ollama instance and return the generated text."""
+    """Send a prompt to the local Ollama instance and return the generated text.
+
+    When ``metrics`` is given it is filled with Ollama's token counts and
+    durations (nanoseconds) for the successful generation.
+    """
 
     payload: Dict[str, Any] = {
         "model": model,
@@ -85,6 +90,17 @@ def generate_response(
             logger.warning("Ollama returned an empty response for model %s", model)
             raise OllamaError("Ollama returned an empty response", reason="empty_response")
 
+        if metrics is not None:
+            for key in (
+                "eval_count",
+                "eval_duration",
+                "prompt_eval_count",
+                "prompt_eval_duration",
+                "total_duration",
+            ):
+                if key in data:
+                    metrics[key] = data[key]
+
         return result.strip()
 
     raise OllamaError("Local AI service is unavailable", reason=str(last_exception) if last_exception else None)
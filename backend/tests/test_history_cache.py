@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from backend.services.history_cache import CachedChat, HistoryCache
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def chat(chat_id: int, *, seconds: Optional[int] = None, sender: str = "user") -> CachedChat:
+    offset = chat_id if seconds is None else seconds
+    return CachedChat(
+        id=chat_id,
+        user_id=1,
+        message=f"message {chat_id}",
+        sender=sender,
+        timestamp=START + timedelta(seconds=offset),
+    )
+
+
+def make_cache(**overrides) -> HistoryCache:
+    settings = {"capacity": 4, "max_users": 10, "max_bytes": 10**6}
+    settings.update(overrides)
+    return HistoryCache(**settings)
+
+
+def ids(entries) -> list:
+    return [entry.id for entry in entries]
+
+
+def test_miss_loads_once_then_serves_hits():
+    cache = make_cache()
+    calls = []
+
+    def loader(limit):
+        calls.append(limit)
+        return [chat(1), chat(2), chat(3)]
+
+    assert ids(cache.recent(1, 2, loader)) == [2, 3]
+    assert ids(cache.recent(1, 10, loader)) == [1, 2, 3]
+    assert calls == [4]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_append_keeps_only_the_most_recent_entries():
+    cache = make_cache()
+    cache.recent(1, 1, lambda limit: [chat(1), chat(2), chat(3)])
+
+    cache.append(1, [chat(4), chat(5)])
+
+    assert ids(cache.recent(1, 4, lambda limit: [])) == [2, 3, 4, 5]
+    # The buffer now holds only the tail, so a deeper page goes to the database.
+    assert ids(cache.recent(1, 5, lambda limit: [chat(9)])) == [9]
+
+
+def test_concurrent_turns_are_ordered_like_the_database():
+    cache = make_cache(capacity=10)
+    cache.recent(1, 1, lambda limit: [])
+
+    a_user, b_user = chat(1, seconds=1), chat(2, seconds=2)
+    a_reply, b_reply = chat(3, seconds=3, sender="assistant"), chat(4, seconds=4, sender="assistant")
+    cache.append(1, [a_user, a_reply])
+    cache.append(1, [b_user, b_reply])
+
+    assert ids(cache.recent(1, 10, lambda limit: [])) == [1, 2, 3, 4]
+
+
+def test_write_during_overlapping_loads_is_not_lost():
+    cache = make_cache()
+    database = [chat(1)]
+
+    def second_loader(limit):
+        return list(database)
+
+    def first_loader(limit):
+        stale = list(database)
+        # A turn commits while this load is in flight, then a second miss starts.
+        database.append(chat(2))
+        cache.append(1, [chat(2)])
+        cache.recent(1, 2, second_loader)
+        return stale
+
+    assert ids(cache.recent(1, 2, first_loader)) == [1]
+    assert ids(cache.recent(1, 2, lambda limit: list(database))) == [1, 2]
+
+
+def test_append_after_a_load_that_saw_the_commit_does_not_duplicate():
+    cache = make_cache()
+    # A concurrent miss loads the turn right after it commits, before append runs.
+    cache.recent(1, 4, lambda limit: [chat(1), chat(2, sender="assistant")])
+
+    cache.append(1, [chat(1), chat(2, sender="assistant")])
+
+    assert ids(cache.recent(1, 4, lambda limit: [])) == [1, 2]
+    assert cache.stats()["bytes"] == sum(entry.size for entry in (chat(1), chat(2)))
+
+
+def test_idle_users_are_evicted_first():
+    cache = make_cache(max_users=2)
+    for user_id in (1, 2):
+        cache.recent(user_id, 1, lambda limit: [chat(1)])
+    cache.recent(1, 1, lambda limit: [])  # touch user 1
+
+    cache.recent(3, 1, lambda limit: [chat(1)])
+
+    stats = cache.stats()
+    assert stats["users"] == 2
+    assert stats["evictions"] == 1
+    assert ids(cache.recent(2, 1, lambda limit: [chat(7)])) == [7]
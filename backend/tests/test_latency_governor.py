@@ -0,0 +1,151 @@
+from backend.services.latency_governor import TIERS, LatencyGovernor
+
+FULL, REDUCED, MINIMAL = TIERS
+PRIMARY = "llama2"
+
+# Prompt shape: 600 fixed characters plus 200 per history message, at 4
+# characters per token and 200 prompt tokens/sec.
+FIXED_CHARS = 600
+CHARS_PER_MESSAGE = 200
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_governor(**overrides) -> LatencyGovernor:
+    settings = {"budget_ms": 25000, "queue_soft_limit": 2, "queue_hard_limit": 4}
+    settings.update(overrides)
+    return LatencyGovernor(**settings)
+
+
+def record(
+    governor: LatencyGovernor,
+    *,
+    reply_tokens: int,
+    tokens_per_sec: float,
+    model: str = PRIMARY,
+    tier=FULL,
+    history_messages: int = 10,
+) -> None:
+    history_chars = CHARS_PER_MESSAGE * history_messages
+    prompt_chars = FIXED_CHARS + history_chars
+    prompt_tokens = prompt_chars // 4
+    metrics = {
+        "eval_count": reply_tokens,
+        "eval_duration": int(reply_tokens / tokens_per_sec * 1e9),
+        "prompt_eval_count": prompt_tokens,
+        "prompt_eval_duration": int(prompt_tokens / 200 * 1e9),
+    }
+    governor.record(
+        model,
+        metrics,
+        tier=tier,
+        prompt_chars=prompt_chars,
+        history_chars=history_chars,
+        history_messages=history_messages,
+    )
+
+
+def test_each_tier_is_strictly_cheaper_than_the_last():
+    governor = make_governor()
+    record(governor, reply_tokens=200, tokens_per_sec=20)
+
+    projections = [governor.projected_ms(tier, 1, PRIMARY) for tier in TIERS]
+
+    assert projections[0] > projections[1] > projections[2]
+
+
+def test_fixed_prompt_cost_is_not_scaled_by_history_depth():
+    short = make_governor()
+    record(short, reply_tokens=200, tokens_per_sec=20, history_messages=1)
+    long = make_governor()
+    record(long, reply_tokens=200, tokens_per_sec=20, history_messages=10)
+
+    for tier in TIERS:
+        assert abs(short.projected_ms(tier, 1, PRIMARY) - long.projected_ms(tier, 1, PRIMARY)) < 1
+
+
+def test_choose_reaches_every_tier_as_depth_grows():
+    governor = make_governor()
+    record(governor, reply_tokens=200, tokens_per_sec=20)
+
+    assert governor.choose(1, PRIMARY) is FULL
+    assert governor.choose(2, PRIMARY) is REDUCED
+    assert governor.choose(3, PRIMARY) is MINIMAL
+
+
+def test_hard_limit_forces_minimal_tier():
+    governor = make_governor(budget_ms=10**9)
+    record(governor, reply_tokens=200, tokens_per_sec=20)
+
+    assert governor.choose(4, PRIMARY) is FULL
+    assert governor.choose(5, PRIMARY) is MINIMAL
+
+
+def test_soft_limit_applies_before_any_measurement():
+    governor = make_governor()
+
+    assert governor.projected_ms(FULL, 1, PRIMARY) is None
+    assert governor.choose(2, PRIMARY) is FULL
+    assert governor.choose(3, PRIMARY) is REDUCED
+    assert governor.choose(5, PRIMARY) is MINIMAL
+
+
+def test_full_quality_is_restored_when_depth_drops():
+    governor = make_governor()
+    record(governor, reply_tokens=200, tokens_per_sec=20)
+
+    assert governor.choose(3, PRIMARY) is MINIMAL
+    assert governor.choose(1, PRIMARY) is FULL
+
+
+def test_capped_replies_do_not_shrink_the_reply_length_average():
+    governor = make_governor(budget_ms=20000)
+    record(governor, reply_tokens=500, tokens_per_sec=10)
+    assert governor.choose(1, PRIMARY) is MINIMAL
+
+    for _ in range(5):
+        record(
+            governor,
+            reply_tokens=MINIMAL.num_predict,
+            tokens_per_sec=10,
+            tier=MINIMAL,
+            history_messages=2,
+        )
+        assert governor.choose(1, PRIMARY) is MINIMAL
+
+
+def test_recovers_from_fallback_tier_once_primary_measurements_expire():
+    clock = FakeClock()
+    governor = make_governor(budget_ms=20000, fallback_model="tiny", stale_after=120, clock=clock)
+    record(governor, reply_tokens=200, tokens_per_sec=8)
+
+    tier = governor.choose(1, PRIMARY)
+    assert tier is MINIMAL
+    assert governor.model_for(tier, PRIMARY) == "tiny"
+
+    # The fast fallback's numbers are kept apart and never make the primary look cheap.
+    for _ in range(3):
+        clock.now += 30
+        record(governor, reply_tokens=100, tokens_per_sec=80, model="tiny", tier=MINIMAL, history_messages=2)
+        assert governor.choose(1, PRIMARY) is MINIMAL
+
+    # No primary generation for longer than stale_after: re-measure at full quality.
+    clock.now += 31
+    assert governor.choose(1, PRIMARY) is FULL
+    assert governor.choose(3, PRIMARY) is REDUCED
+
+
+def test_track_reports_queue_depth():
+    governor = make_governor()
+
+    with governor.track() as first:
+        with governor.track() as second:
+            assert (first, second) == (1, 2)
+    with governor.track() as again:
+        assert again == 1
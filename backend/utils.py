@@ -1,7 +1,8 @@
+import hmac
 from functools import wraps
 from typing import Callable, Optional
 
-from flask import jsonify, session
+from flask import current_app, jsonify, request, session
 
 from .extensions import db
 from .models import User
@@ -26,3 +27,24 @@ def login_required(view: Callable):
         return view(user, *args, **kwargs)
 
     return wrapped
+
+
+def is_admin_request() -> bool:
+    """Check the ``X-Admin-Token`` header against the configured admin token."""
+    expected = current_app.config.get("ADMIN_TOKEN")
+    supplied = request.headers.get("X-Admin-Token", "")
+    if not expected or not supplied:
+        return False
+    return hmac.compare_digest(supplied.encode(), expected.encode())
+
+
+def admin_required(view: Callable):
+    """Decorator that restricts operational endpoints to holders of the admin token."""
+
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not is_admin_request():
+            return jsonify({"error": "Admin token required"}), 403
+        return view(*args, **kwargs)
+
+    return wrapped